@@ -18,14 +18,22 @@ ASN_DATA_FILEPATH = os.path.join('asn_data', 'asn.dat')
 
 def get_bgp2vec(aspaths_filepath: str):
     corpus = gensim.models.word2vec.LineSentence(aspaths_filepath, limit=PARAMETER_NPATHS)
+    return get_bgp2vec_from_corpus(corpus)
+
+
+def get_bgp2vec_from_corpus(corpus,
+                            vector_size=PARAMETER_VECTOR_SIZE,
+                            window=PARAMETER_WINDOW,
+                            negative=PARAMETER_NEGATIVE_SAMPLES,
+                            workers=NWORKERS_WORD2VEC):
     return gensim.models.Word2Vec(sentences=corpus,
-                                  window=PARAMETER_WINDOW,
-                                  negative=PARAMETER_NEGATIVE_SAMPLES,
+                                  window=window,
+                                  negative=negative,
                                   seed=PARAMETER_SEED,
                                   hs=1,
                                   min_count=1,
-                                  workers=NWORKERS_WORD2VEC,
-                                  vector_size=PARAMETER_VECTOR_SIZE)
+                                  workers=workers,
+                                  vector_size=vector_size)
 
 
 def get_neighbors_table(bgp2vec, target_asn: str, asn_data_filepath: str):
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+'''
+Customer cones of ASes computed from the P2C and S2S relationships inferred by ProbLink.
+
+The customer cone of an AS is the set of ASes reachable from it following provider to customer
+and sibling links, including the AS itself. Siblings, and any cycle of P2C links, end up in the
+same strongly connected component and thus share the same cone.
+
+Each AS gets an index in the order in which the depth-first search of the components finishes,
+so that customers always get lower indices than their providers and most of a cone is a single
+interval ending at its AS. Cones are built in a single pass over the components in topological
+order, each one being the union of the cones of its customers, and are stored as the sorted
+intervals of consecutive indices they contain. Membership is answered by bisecting these
+intervals.
+'''
+
+import argparse
+import array
+import bisect
+import pickle
+import sys
+
+import vf_with_problink_data as vf
+
+
+def _get_customer_edges(graph):
+    edges = {}
+    nodes = set()
+
+    for (as1, as2), rel in graph.items():
+        if rel is None:
+            continue
+        nodes.add(as1)
+        nodes.add(as2)
+
+        if rel == 'P2C':
+            edges.setdefault(as1, []).append(as2)
+        elif rel == 'S2S':
+            edges.setdefault(as1, []).append(as2)
+            edges.setdefault(as2, []).append(as1)
+
+    return sorted(nodes), edges
+
+
+def _strongly_connected_components(nodes, edges):
+    '''
+    Iterative version of Tarjan's algorithm. Components are returned in reverse topological
+    order, so that every component comes after the components reachable from it.
+    '''
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+
+    def visit(node):
+        index[node] = lowlink[node] = len(index)
+        stack.append(node)
+        on_stack.add(node)
+        return node, iter(edges.get(node, ()))
+
+    for root in nodes:
+        if root in index:
+            continue
+
+        work = [visit(root)]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    work.append(visit(child))
+                    break
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def _merge_runs(runs):
+    '''Merges [start, end) intervals into the sorted list of disjoint runs covering them.'''
+    merged = []
+    for start, end in sorted(runs):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+class CustomerConeIndex():
+
+    def __init__(self, asns, component_of, runs, sizes):
+        self.asns = asns
+        self.bits = {asn: b for b, asn in enumerate(asns)}
+        self.component_of = component_of
+        self.runs = runs
+        self.sizes = sizes
+
+    @classmethod
+    def from_graph(cls, graph):
+        '''Builds the index from a mapping of (as1, as2) to relationships, as in ASRelationshipGraph.'''
+        nodes, edges = _get_customer_edges(graph)
+        components = _strongly_connected_components(nodes, edges)
+
+        asns = []
+        component_of = {}
+        for i, component in enumerate(components):
+            for asn in component:
+                asns.append(asn)
+                component_of[asn] = i
+        bits = {asn: b for b, asn in enumerate(asns)}
+
+        cones = []
+        for i, component in enumerate(components):
+            cone = []
+            customer_components = set()
+            for asn in component:
+                cone.append((bits[asn], bits[asn] + 1))
+                for customer in edges.get(asn, ()):
+                    customer_components.add(component_of[customer])
+
+            customer_components.discard(i)
+            for c in customer_components:
+                cone.extend(cones[c])
+            cones.append(_merge_runs(cone))
+
+        sizes = [sum(end - start for start, end in cone) for cone in cones]
+        runs = [array.array('I', [b for run in cone for b in run]) for cone in cones]
+
+        return cls(asns, component_of, runs, sizes)
+
+    def in_customer_cone(self, asn, provider):
+        if asn == provider:
+            return True
+
+        try:
+            runs = self.runs[self.component_of[provider]]
+            bit = self.bits[asn]
+        except KeyError:
+            return False
+
+        # Inside a run when bisecting falls between its start and its end
+        return bisect.bisect_right(runs, bit) % 2 == 1
+
+    def get_cone_size(self, asn):
+        if asn not in self.component_of:
+            return 1
+        return self.sizes[self.component_of[asn]]
+
+    def get_customer_cone(self, asn):
+        if asn not in self.component_of:
+            return {asn}
+
+        runs = self.runs[self.component_of[asn]]
+        return {self.asns[b] for start, end in zip(runs[::2], runs[1::2]) for b in range(start, end)}
+
+    def save(self, filepath):
+        with open(filepath, 'wb') as f:
+            pickle.dump((self.asns, self.component_of, self.runs, self.sizes), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, 'rb') as f:
+            return cls(*pickle.load(f))
+
+
+def main(args):
+    asr = vf.ASRelationshipGraph(args.as_relationships)
+
+    try:
+        asr.store.get_version(args.as_of)
+    except ValueError as e:
+        sys.exit(f'Cannot use --as-of {args.as_of}: {e}')
+
+    index = CustomerConeIndex.from_graph(asr.store.checkout(args.as_of))
+    index.save(args.output)
+
+    print(f'Computed customer cones of {len(index.bits)} ASes '
+          f'in {len(index.runs)} components', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('as_relationships',
+                        help='path to a file describing AS relationships, or to a directory of '
+                        'such files whose names start with their date (YYYYMMDD)')
+    parser.add_argument('output', help='path where the customer cone index will be saved')
+    parser.add_argument('--as-of', default=None, type=vf.dt.date.fromisoformat,
+                        help='use the relationships as of this date (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    main(args)
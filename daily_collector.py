@@ -41,30 +41,27 @@ COLLECTORS = [
     'route-views.gixa',
 ]
 
-def parse_path(path_str, not_collapse_prepending_asns=False):
-    if not_collapse_prepending_asns:
-        return path_str
-
-    path = path_str.split(' ')
-
+def collapse_prepending(path):
     path_clean = [path[0]]
     for u in path[1:]:
         if u != path_clean[-1]:
             path_clean.append(u)
 
-    path_clean_str = ' '.join(path_clean)
+    return path_clean
 
-    return path_clean_str
 
+def parse_path(path_str, not_collapse_prepending_asns=False):
+    if not_collapse_prepending_asns:
+        return path_str
 
-def main(args):
+    path_clean_str = ' '.join(collapse_prepending(path_str.split(' ')))
 
-    start_date_time = dt.datetime.combine(args.start_date, args.time)
+    return path_clean_str
 
-    days_collectors = it.product(range(args.ndays), COLLECTORS)
-    tqdm_total = args.ndays*len(COLLECTORS)
 
-    unique_paths = set()
+def get_ribs_streams(start_date_time, ndays, collectors=COLLECTORS):
+    days_collectors = it.product(range(ndays), collectors)
+    tqdm_total = ndays*len(collectors)
 
     for nday, collector in tqdm(days_collectors, desc='Days and collectors', total=tqdm_total):
         date_time = start_date_time + dt.timedelta(days=nday)
@@ -78,6 +75,17 @@ def main(args):
             record_type="ribs",
         )
 
+        yield collector, stream
+
+
+def main(args):
+
+    start_date_time = dt.datetime.combine(args.start_date, args.time)
+
+    unique_paths = set()
+
+    for collector, stream in get_ribs_streams(start_date_time, args.ndays):
+
         n_paths_for_pair = 0
 
         for elem in stream:
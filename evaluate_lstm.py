@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+'''
+Evaluates a trained LSTM model over held-out labeled paths, for many thresholds at once.
+
+The labeled paths are read in chunks, so the held-out set does not have to fit in memory. Only
+the histograms of the predicted probabilities of GREEN and RED paths are kept, and from them
+the confusion matrix, precision and recall are computed for every threshold between 0 and 1 in
+steps of 1/nbins. A path is classified as RED when its probability is at least the threshold.
+'''
+
+import argparse
+import itertools as it
+import sys
+
+import numpy as np
+import pandas as pd
+
+from gensim.models import KeyedVectors
+from tensorflow import keras
+from tensorflow.keras.preprocessing.sequence import pad_sequences
+
+import lstm_hijack_classifier as lstm
+
+
+CHUNK_SIZE = 100000
+NBINS = 1000
+
+
+def read_chunks(f, chunk_size=CHUNK_SIZE):
+    while True:
+        lines = list(it.islice(f, chunk_size))
+        if not lines:
+            return
+        yield lines
+
+
+def encode_chunk(b2v, lines, maxlen):
+    paths = []
+    labels = []
+    errors = 0
+
+    for line in lines:
+        try:
+            path_str, color = line.rstrip().rsplit(',', 1)
+        except ValueError:
+            errors += 1
+            continue
+
+        try:
+            paths.append([b2v.wv.key_to_index[asn] + 1 for asn in path_str.split(' ')])
+        except KeyError:
+            errors += 1
+            continue
+        labels.append(0 if color == 'GREEN' else 1)
+
+    X = pad_sequences(paths, maxlen=maxlen, padding="post", truncating="pre", value=0)
+    return X, np.array(labels, dtype=np.int8), errors
+
+
+class ThresholdHistogram():
+
+    def __init__(self, nbins=NBINS):
+        self.edges = np.linspace(0, 1, nbins + 1)
+        self.counts = np.zeros((2, nbins), dtype=np.int64)
+
+    def add(self, probabilities, labels):
+        for label in (0, 1):
+            self.counts[label] += np.histogram(probabilities[labels == label], bins=self.edges)[0]
+
+    def get_table(self):
+        # Paths classified as RED at each threshold are those in its bin or above
+        above = self.counts[:, ::-1].cumsum(axis=1)[:, ::-1]
+        totals = self.counts.sum(axis=1)
+
+        fp, tp = above[0], above[1]
+        tn, fn = totals[0] - fp, totals[1] - tp
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return pd.DataFrame({
+                'threshold': self.edges[:-1],
+                'tn': tn,
+                'fp': fp,
+                'fn': fn,
+                'tp': tp,
+                'precision': tp/(tp + fp),
+                'recall': tp/(tp + fn),
+                'false_positive_rate': fp/(fp + tn),
+            })
+
+
+def main(args):
+    b2v = KeyedVectors.load(args.b2v)
+    model = keras.models.load_model(args.model)
+
+    # Models trained by sweep.py may use other lengths than lstm.MAXLEN
+    maxlen = model.input_shape[1]
+
+    histogram = ThresholdHistogram(args.nbins)
+    errors = 0
+
+    with open(args.labeled_paths) as f:
+        for lines in read_chunks(f, args.chunk_size):
+            X, Y, chunk_errors = encode_chunk(b2v, lines, maxlen)
+            errors += chunk_errors
+            if len(Y) == 0:
+                continue
+
+            probabilities = model.predict(X, batch_size=args.batch_size)[:, 0]
+            histogram.add(probabilities, Y)
+
+    print(f'Lines skipped due to parsing errors or ASNs unknown to bgp2vec: {errors}',
+          file=sys.stderr)
+
+    histogram.get_table().to_csv(sys.stdout, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('b2v', help='path to the trained bgp2vec model')
+    parser.add_argument('model', help='path to the trained LSTM model')
+    parser.add_argument('labeled_paths', help='path to file containing the held-out labeled paths')
+    parser.add_argument('--nbins', type=int, default=NBINS,
+                        help='number of thresholds evaluated between 0 and 1')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='number of paths read and predicted at a time')
+    parser.add_argument('--batch-size', type=int, default=lstm.BATCH_SIZE,
+                        help='batch size used for prediction')
+    args = parser.parse_args()
+
+    main(args)
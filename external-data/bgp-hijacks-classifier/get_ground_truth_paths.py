@@ -1,11 +1,29 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 
 '''
-WARNING: this must be run with python2
+Extracts the paths to the hijacked prefix from the pickles of bgp-hijacks-classifier's
+`collections`. The pickles were written by Python 2, so they are decoded using latin1.
+
+Many event archives can be given at once, and they are processed in a pool of processes. For
+each archive, the deduplicated paths without AS prepending are written to a file with the same
+name in the output directory, in the format expected by `validation_gt.py`. A summary CSV
+describing every event is also written, so that it can be used as `validation_gt.py`'s
+`gt_summary`. The hijacker and victim ASNs of the events are taken from `news_updated.csv` and,
+for the events missing from it, from `results_news_updated_2.csv`.
 '''
 
-import pickle
 import argparse
+import ast
+import csv
+import multiprocessing as mp
+import os
+import pickle
+import sys
+
+from tqdm import tqdm
+
+
+SUMMARY_FIELDS = ['title', 'hj_as', 'vt_as', 'hj_pfx', 'npaths']
 
 
 def parse_path(path_str):
@@ -21,28 +39,124 @@ def parse_path(path_str):
     return path_clean_str
 
 
-def get_hijacked_paths(filepath):
+def load_legacy_pickle(filepath):
+    with open(filepath, 'rb') as f:
+        return pickle.load(f, encoding='latin1')
 
-    unique = set()
 
-    f = open(filepath, 'r')
-    x = pickle.load(f)
+def get_hijacked_paths(filepath):
+    x = load_legacy_pickle(filepath)
+    hijack_prefix = x['hijack_prefix']
+
+    seen_raw = set()
+    unique = {}
 
     for collector, data in x['as_paths'].items():
         for ip, prefixed_paths in data.items():
-            for prefix, anouncement in prefixed_paths.items():
-                if prefix == x['hijack_prefix']:
-                    for a in anouncement:
-                        if a[2] and (a[2] not in unique):
-                            path = parse_path(a[2])
-                            print(path)
-                            unique.add(path)
+            anouncement = prefixed_paths.get(hijack_prefix)
+            if not anouncement:
+                continue
+
+            for a in anouncement:
+                path_str = a[2]
+                if not path_str or path_str in seen_raw:
+                    continue
+                seen_raw.add(path_str)
+
+                # dict keeps the order in which the paths were first seen
+                unique.setdefault(parse_path(path_str), None)
+
+    return hijack_prefix, list(unique)
+
+
+def extract_event(job):
+    filepath, output_dir = job
+
+    title = os.path.split(filepath)[1]
+    try:
+        hijack_prefix, paths = get_hijacked_paths(filepath)
+    except Exception as e:
+        return title, None, f'Error parsing {filepath}: {e!r}'
+
+    with open(os.path.join(output_dir, title), 'w') as f:
+        for path in paths:
+            f.write(path)
+            f.write('\n')
+
+    return title, {'hj_pfx': hijack_prefix, 'npaths': len(paths)}, None
+
+
+def read_events(events_filepath):
+    '''Maps each event title to its hijacker and victim ASNs, as given in news_updated.csv.'''
+    events = {}
+    if not events_filepath:
+        return events
+
+    with open(events_filepath) as f:
+        for row in csv.DictReader(f):
+            hj_as = [asn.strip() for asn in row['hijack_as'].split(',') if asn.strip()]
+            events[row['title']] = {'hj_as': hj_as, 'vt_as': row['victim_as']}
+
+    return events
+
+
+def read_results(results_filepath):
+    '''Maps each event title to its hijacker and victim ASNs, as given in the results CSV.'''
+    events = {}
+    if not results_filepath:
+        return events
+
+    with open(results_filepath) as f:
+        for row in csv.DictReader(f):
+            events[os.path.splitext(row['title'])[0]] = {
+                'hj_as': [str(asn) for asn in ast.literal_eval(row['hj_as'])],
+                'vt_as': row['vt_as'],
+            }
+
+    return events
+
+
+def main(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    # Events in news_updated.csv take precedence over the ones in the results
+    events = {**read_results(args.results), **read_events(args.events)}
+
+    jobs = [(filepath, args.output_dir) for filepath in args.pickles]
+
+    summary = []
+    with mp.Pool(args.nprocesses) as pool:
+        results = pool.imap_unordered(extract_event, jobs)
+        for title, info, error in tqdm(results, desc='Events', total=len(jobs)):
+            if error:
+                print(error, file=sys.stderr)
+                continue
+
+            event = events.get(os.path.splitext(title)[0])
+            if event is None:
+                print(f'No hijacker and victim ASNs found for {title}', file=sys.stderr)
+                event = {'hj_as': [], 'vt_as': ''}
+
+            summary.append({'title': title, 'hj_as': str(event['hj_as']),
+                            'vt_as': event['vt_as'], **info})
+
+    summary.sort(key=lambda row: row['title'])
+    with open(args.summary, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(summary)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument('filepath', help='path to the pickle file')
+    parser.add_argument('output_dir', help='directory where the paths of each event are written')
+    parser.add_argument('summary', help='path where the summary CSV will be saved')
+    parser.add_argument('pickles', nargs='+', help='paths to the pickle files of the events')
+    parser.add_argument('--events', help='path to the events description (news_updated.csv)')
+    parser.add_argument('--results',
+                        help='path to the events results (results_news_updated_2.csv), used for '
+                        'events missing from --events')
+    parser.add_argument('-j', '--nprocesses', type=int, default=None,
+                        help='number of worker processes (default: number of cpus)')
     args = parser.parse_args()
 
-    get_hijacked_paths(args.filepath)
-
+    main(args)
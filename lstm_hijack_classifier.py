@@ -14,6 +14,11 @@ from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.preprocessing.sequence import pad_sequences
 
 
+MAXLEN = 13
+BATCH_SIZE = 64
+EPOCHS = 10
+
+
 def get_confusion_matrix(labels, predictions):
     conf_matrix_abs = tf.math.confusion_matrix(labels=labels,
                                                predictions=predictions)
@@ -25,6 +30,24 @@ def get_weight_matrix(b2v):
     return np.vstack((np.zeros(b2v.vector_size), b2v.wv.vectors))
 
 
+def build_model(embedding_vectors, maxlen=MAXLEN):
+    vocab_size, embedding_size = embedding_vectors.shape
+
+    model = keras.Sequential()
+    model.add(layers.Embedding(input_dim=vocab_size, name="BGP2Vec", output_dim=embedding_size,
+                               input_length=maxlen, mask_zero=True, trainable=False, weights=[embedding_vectors]))
+    model.add(layers.Conv1D(filters=32, kernel_size=3, activation='relu', padding='same'))
+    model.add(layers.MaxPooling1D(pool_size=2, strides=2))
+    model.add(layers.LSTM(100))
+    model.add(layers.Dense(1, activation='sigmoid'))
+
+    model.compile(loss='binary_crossentropy',
+                  optimizer=Adam(lr=0.0001, decay=1e-6),
+                  metrics=['accuracy'])
+
+    return model
+
+
 def main(args):
     b2v = KeyedVectors.load(args.b2v)
 
@@ -32,35 +55,29 @@ def main(args):
                           converters={0: lambda x: x.split()})
 
     Xunpad = [[b2v.wv.key_to_index[asn] + 1 for asn in path] for path in data_df[0]]
-    X = pad_sequences(Xunpad, maxlen=13, padding="post", truncating="pre",
+    X = pad_sequences(Xunpad, maxlen=MAXLEN, padding="post", truncating="pre",
                   value=0)
 
     Ydf = list(data_df[1] == 'GREEN')
     Y = [0 if y else 1 for y in Ydf]
 
-    x_train, x_test, y_train, y_test = train_test_split(X, Y, train_size=0.8)
-
-    embedding_vectors = get_weight_matrix(b2v)
+    x_train, x_test, y_train, y_test, _, test_rows = train_test_split(X, Y, data_df.index,
+                                                                      train_size=0.8)
 
-    vocab_size, embedding_size = b2v.wv.vectors.shape
+    if args.held_out:
+        held_out_df = data_df.loc[test_rows].copy()
+        held_out_df[0] = held_out_df[0].map(' '.join)
+        held_out_df.to_csv(args.held_out, header=False, index=False)
 
-    model = keras.Sequential()
-    model.add(layers.Embedding(input_dim=vocab_size + 1, name="BGP2Vec", output_dim=embedding_size,
-                               input_length=13, mask_zero=True, trainable=False, weights=[embedding_vectors]))
-    model.add(layers.Conv1D(filters=32, kernel_size=3, activation='relu', padding='same'))
-    model.add(layers.MaxPooling1D(pool_size=2, strides=2))
-    model.add(layers.LSTM(100))
-    model.add(layers.Dense(1, activation='sigmoid'))
+    embedding_vectors = get_weight_matrix(b2v)
 
-    model.compile(loss='binary_crossentropy',
-                  optimizer=Adam(lr=0.0001, decay=1e-6),
-                  metrics=['accuracy'])
+    model = build_model(embedding_vectors)
 
     model.summary()
 
     model.fit(
         np.asarray(x_train), np.asarray(y_train),
-        validation_data=(np.asarray(x_test), np.asarray(y_test)), batch_size=64, epochs=10
+        validation_data=(np.asarray(x_test), np.asarray(y_test)), batch_size=BATCH_SIZE, epochs=EPOCHS
     )
 
     preds = model.predict_classes(x_test)
@@ -79,6 +96,8 @@ if __name__ == "__main__":
         help='path to file containing labeled the paths for training and testing'
     )
     parser.add_argument('output', help='path where the LSTM model will be saved')
+    parser.add_argument('--held-out', default=None,
+                        help='path where the labeled paths used for testing will be saved')
     args = parser.parse_args()
 
     main(args)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+'''
+Day-over-day changes in the paths collected by `daily_collector.py`.
+
+The paths seen in a day are kept in an index, saved between runs, mapping each path to the
+collectors where it was seen, its VF label and its score. Comparing a new collection against
+the previous day's index gives the (collector, path) pairs that were added or withdrawn. Only
+paths that are new to the index, or that are still unlabeled, are labeled, while the labels and
+scores of the other paths are carried over, so that the work done downstream follows the
+routing churn instead of the size of the tables. Paths that cannot be labeled, such as those
+with AS sets, get the label ERROR so that they are not retried every day. The paths without a
+score are listed so that only they are scored, and their scores are then stored with `scores`.
+
+The collection must be in the format output by `daily_collector.py` without `--path-only`,
+and `--not-only-unique-paths` should be used so that every collector of a path is known.
+'''
+
+import argparse
+import pickle
+import sys
+
+import vf_with_problink_data as vf
+
+
+LABEL_ERROR = 'ERROR'
+
+class PathIndex():
+
+    def __init__(self):
+        self.collectors = []
+        # Maps path to [collectors bitmask, label, score], where None means not computed yet
+        self.paths = {}
+
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, 'rb') as f:
+            collectors, paths = pickle.load(f)
+
+        index = cls()
+        index.collectors = collectors
+        index.paths = paths
+        return index
+
+    def save(self, filepath):
+        with open(filepath, 'wb') as f:
+            pickle.dump((self.collectors, self.paths), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def get_collector_bit(self, collector):
+        try:
+            return 1 << self.collectors.index(collector)
+        except ValueError:
+            self.collectors.append(collector)
+            return 1 << (len(self.collectors) - 1)
+
+    def get_collectors(self, mask):
+        return [c for i, c in enumerate(self.collectors) if (mask >> i) & 1]
+
+
+def read_collection(f, previous):
+    '''Reads a collection into a new index that shares the collectors numbering of previous.'''
+    index = PathIndex()
+    index.collectors = list(previous.collectors)
+    collector_bits = {}
+
+    for i, line in enumerate(f):
+        try:
+            _, collector, path_str = line.rstrip().split('|')
+        except ValueError:
+            print(f'Error parsing line {i}: {line.rstrip()}', file=sys.stderr)
+            continue
+
+        if collector not in collector_bits:
+            collector_bits[collector] = index.get_collector_bit(collector)
+
+        entry = index.paths.get(path_str)
+        if entry is None:
+            index.paths[path_str] = [collector_bits[collector], None, None]
+        else:
+            entry[0] |= collector_bits[collector]
+
+    return index
+
+
+def get_delta(previous, current):
+    '''
+    Returns the added and withdrawn (collector, path) pairs, and the paths new to the index.
+    Labels and scores of the paths in both indexes are copied from previous to current.
+    '''
+    added = []
+    withdrawn = []
+    new_paths = []
+
+    for path_str, entry in current.paths.items():
+        previous_entry = previous.paths.get(path_str)
+        if previous_entry is None:
+            new_paths.append(path_str)
+            previous_mask = 0
+        else:
+            previous_mask = previous_entry[0]
+            entry[1], entry[2] = previous_entry[1], previous_entry[2]
+
+        for collector in current.get_collectors(entry[0] & ~previous_mask):
+            added.append((collector, path_str))
+
+    for path_str, previous_entry in previous.paths.items():
+        entry = current.paths.get(path_str)
+        mask = 0 if entry is None else entry[0]
+
+        for collector in previous.get_collectors(previous_entry[0] & ~mask):
+            withdrawn.append((collector, path_str))
+
+    return added, withdrawn, new_paths
+
+
+def label_paths(asr, index, paths):
+    not_vf = 0
+    for path_str in paths:
+        try:
+            vf_class = asr.is_vf(list(map(int, path_str.split(' '))))
+        except ValueError:
+            print(f'Error parsing path: {path_str}', file=sys.stderr)
+            index.paths[path_str][1] = LABEL_ERROR
+            continue
+
+        index.paths[path_str][1] = 'GREEN' if vf_class else 'RED'
+        if not vf_class:
+            not_vf += 1
+
+    return not_vf
+
+
+def read_scores(f):
+    scores = {}
+    for line in f:
+        path_str, score = line.rstrip().rsplit(',', 1)
+        scores[path_str] = float(score)
+
+    return scores
+
+
+def write_pairs(filepath, pairs):
+    with open(filepath, 'w') as f:
+        f.writelines(f'{collector}|{path_str}\n' for collector, path_str in pairs)
+
+
+def delta(args):
+    previous = PathIndex.load(args.previous) if args.previous else PathIndex()
+
+    with open(args.collection) as f:
+        current = read_collection(f, previous)
+
+    added, withdrawn, new_paths = get_delta(previous, current)
+
+    if args.as_relationships:
+        # Besides new paths, this includes those left unlabeled by a previous day
+        unlabeled = [path_str for path_str, entry in current.paths.items() if entry[1] is None]
+        asr = vf.ASRelationshipGraph(args.as_relationships)
+        not_vf = label_paths(asr, current, unlabeled)
+        print(f'Not VF among unlabeled paths: {not_vf}/{len(unlabeled)}', file=sys.stderr)
+
+    write_pairs(args.added, added)
+    write_pairs(args.withdrawn, withdrawn)
+
+    if args.labeled_output:
+        with open(args.labeled_output, 'w') as f:
+            for path_str, (_, label, score) in current.paths.items():
+                if label is None or label == LABEL_ERROR:
+                    continue
+                score_str = '' if score is None else score
+                f.write(f'{path_str},{label},{score_str}\n')
+
+    # Besides new paths, this includes those whose scores were never stored
+    to_score = [path_str for path_str, entry in current.paths.items() if entry[2] is None]
+    if args.to_score:
+        with open(args.to_score, 'w') as f:
+            f.writelines(f'{path_str}\n' for path_str in to_score)
+
+    current.save(args.output)
+
+    print(f'Paths: {len(current.paths)} ({len(new_paths)} new, {len(to_score)} to score), '
+          f'added: {len(added)}, withdrawn: {len(withdrawn)}', file=sys.stderr)
+
+
+def scores(args):
+    index = PathIndex.load(args.index)
+
+    with open(args.scores) as f:
+        for path_str, score in read_scores(f).items():
+            if path_str in index.paths:
+                index.paths[path_str][2] = score
+
+    index.save(args.index)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(required=True)
+
+    parser_delta = subparsers.add_parser('delta', help='compare a collection to the previous index')
+    parser_delta.set_defaults(func=delta)
+    parser_delta.add_argument('collection', help='path to the collection of the new day')
+    parser_delta.add_argument('output', help='path where the index of the new day will be saved')
+    parser_delta.add_argument('added', help='path where the added paths will be saved')
+    parser_delta.add_argument('withdrawn', help='path where the withdrawn paths will be saved')
+    parser_delta.add_argument('--previous', default=None,
+                              help='path to the index of the previous day')
+    parser_delta.add_argument('--as-relationships', default=None,
+                              help='path to a file describing AS relationships, used to label '
+                              'the new and unlabeled paths')
+    parser_delta.add_argument('--labeled-output', default=None,
+                              help='path where all labeled paths of the new day will be saved, '
+                              'in the format path,label,score')
+    parser_delta.add_argument('--to-score', default=None,
+                              help='path where the paths without a score will be saved')
+
+    parser_scores = subparsers.add_parser('scores', help='store scores of paths in an index')
+    parser_scores.set_defaults(func=scores)
+    parser_scores.add_argument('index', help='path to the index, which is updated in place')
+    parser_scores.add_argument('scores', help='path to a file with lines in the format path,score')
+
+    args = parser.parse_args()
+    args.func(args)
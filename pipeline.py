@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+'''
+Runs the collection, VF labeling and corpus generation in a single process.
+
+Paths are streamed from RouteViews once, and go through prepend collapsing, deduplication and VF
+labeling before being written to both the labeled training set (the input of
+`lstm_hijack_classifier.py`) and the corpus (the input of `bgp2vec.py`). The stages run in
+separate threads connected by bounded queues, and paths are passed between them in batches,
+so that each path is split and joined only once.
+'''
+
+import argparse
+import datetime as dt
+import queue
+import sys
+import threading
+
+import daily_collector
+import vf_with_problink_data as vf
+
+
+BATCH_SIZE = 4096
+QUEUE_MAXSIZE = 64
+
+_END = None
+
+
+def _run_stage(target, errors, *args):
+    try:
+        target(*args)
+    except BaseException as e:
+        errors.append(e)
+
+
+def collect_stage(start_date_time, ndays, out_queue):
+    try:
+        for collector, stream in daily_collector.get_ribs_streams(start_date_time, ndays):
+            batch = []
+            for elem in stream:
+                batch.append(elem.fields['as-path'])
+                if len(batch) == BATCH_SIZE:
+                    out_queue.put(batch)
+                    batch = []
+
+            if batch:
+                out_queue.put(batch)
+    finally:
+        out_queue.put(_END)
+
+
+def label_stage(asr, in_queue, out_queue, stats):
+    unique_paths = set()
+
+    try:
+        while True:
+            batch = in_queue.get()
+            if batch is _END:
+                break
+
+            labeled = []
+            for path_str in batch:
+                path = daily_collector.collapse_prepending(path_str.split(' '))
+                path_clean_str = ' '.join(path)
+
+                if path_clean_str in unique_paths:
+                    continue
+                unique_paths.add(path_clean_str)
+
+                try:
+                    is_vf = asr.is_vf(list(map(int, path)))
+                except ValueError:
+                    # Paths with AS sets are kept in the corpus, but cannot be labeled
+                    is_vf = None
+                    stats['errors'] += 1
+
+                labeled.append((path_clean_str, is_vf))
+
+            stats['paths'] += len(labeled)
+            out_queue.put(labeled)
+    finally:
+        out_queue.put(_END)
+
+
+def write_stage(in_queue, labeled_file, corpus_file, stats):
+    while True:
+        labeled = in_queue.get()
+        if labeled is _END:
+            break
+
+        corpus_file.writelines([f'{path_str}\n' for path_str, _ in labeled])
+
+        lines = []
+        for path_str, is_vf in labeled:
+            if is_vf is None:
+                continue
+            if is_vf:
+                lines.append(f'{path_str},GREEN\n')
+            else:
+                lines.append(f'{path_str},RED\n')
+                stats['not_vf'] += 1
+        labeled_file.writelines(lines)
+
+
+def run_pipeline(start_date_time, ndays, asr, labeled_file, corpus_file):
+    paths_queue = queue.Queue(maxsize=QUEUE_MAXSIZE)
+    labeled_queue = queue.Queue(maxsize=QUEUE_MAXSIZE)
+    stats = {'paths': 0, 'not_vf': 0, 'errors': 0}
+    errors = []
+
+    # Daemon threads, so that a failure downstream does not leave us waiting on a full queue
+    collector = threading.Thread(target=_run_stage, daemon=True,
+                                 args=(collect_stage, errors, start_date_time, ndays, paths_queue))
+    labeler = threading.Thread(target=_run_stage, daemon=True,
+                               args=(label_stage, errors, asr, paths_queue, labeled_queue, stats))
+    collector.start()
+    labeler.start()
+
+    write_stage(labeled_queue, labeled_file, corpus_file, stats)
+    labeler.join()
+
+    if errors:
+        raise errors[0]
+
+    collector.join()
+
+    return stats
+
+
+def main(args):
+    start_date_time = dt.datetime.combine(args.start_date, args.time)
+    asr = vf.ASRelationshipGraph(args.as_relationships)
+
+    with open(args.labeled_output, 'w') as labeled_file, open(args.corpus_output, 'w') as corpus_file:
+        stats = run_pipeline(start_date_time, args.ndays, asr, labeled_file, corpus_file)
+
+    print(f'Unique paths: {stats["paths"]}', file=sys.stderr)
+    print(f'Paths not labeled due to parsing errors: {stats["errors"]}', file=sys.stderr)
+    labeled = stats['paths'] - stats['errors']
+    if labeled:
+        print(f'Not VF: {stats["not_vf"]}/{labeled} = {stats["not_vf"]/labeled}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('start_date',
+                        type=lambda s: dt.datetime.strptime(s, '%d/%m/%Y').date(),
+                        help='day when data will start being collected (dd/mm/yyy)')
+    parser.add_argument('time',
+                        type=lambda s: dt.datetime.strptime(s, '%H:%M:%S').time(),
+                        help='time of snapshots (hh:mm:ss)')
+    parser.add_argument('ndays', type=int, help='total number of days when the collection is done')
+    parser.add_argument('as_relationships', help='path to a file describing AS relationships')
+    parser.add_argument('labeled_output', help='path where the labeled paths will be saved')
+    parser.add_argument('corpus_output', help='path where the paths for bgp2vec will be saved')
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+'''
+Hyperparameter sweep over BGP2Vec and the LSTM classifier.
+
+The paths are encoded once into a directory of numpy arrays, which every trial opens as a
+memory map, so that the corpus is parsed only once and its pages are shared by all the
+processes. The encoding is reused by later sweeps as long as the path, size and modification
+time of the input files are the same. The LSTM trials pad the paths of each batch as they are
+needed, so their memory does not grow with the size of the corpus.
+
+The trials run in a pool of processes whose size is given by the core budget divided by the
+cores given to each trial. First all BGP2Vec models are trained, then the LSTM trials for each
+of them. The parameters, validation metrics and wall time of every trial are appended to a
+single CSV table as trials finish, and trials that fail are recorded with their error.
+
+The grid is a JSON object mapping parameter names to lists of values, for example
+    {"vector_size": [16, 32], "window": [2, 3], "maxlen": [9, 13], "epochs": [5]}
+Parameters that are not given take the defaults from `bgp2vec.py` and
+`lstm_hijack_classifier.py`.
+'''
+
+import argparse
+import array
+import csv
+import itertools as it
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from gensim.models import KeyedVectors
+from tensorflow import keras
+
+import bgp2vec
+import lstm_hijack_classifier as lstm
+
+
+BGP2VEC_PARAMETERS = {
+    'vector_size': bgp2vec.PARAMETER_VECTOR_SIZE,
+    'window': bgp2vec.PARAMETER_WINDOW,
+    'negative': bgp2vec.PARAMETER_NEGATIVE_SAMPLES,
+}
+
+LSTM_PARAMETERS = {
+    'maxlen': lstm.MAXLEN,
+    'batch_size': lstm.BATCH_SIZE,
+    'epochs': lstm.EPOCHS,
+}
+
+RESULT_FIELDS = [
+    'trial', 'stage', 'bgp2vec_trial', *BGP2VEC_PARAMETERS, *LSTM_PARAMETERS, 'vocab_size',
+    'val_loss', 'val_accuracy', 'true_negative_rate', 'true_positive_rate', 'wall_time', 'error',
+]
+
+TRAIN_SIZE = 0.8
+SPLIT_SEED = 42
+
+SENTENCES_CHUNK = 65536
+
+_corpus = None
+
+
+def _encode_lines(lines, vocab, tokens, offsets, labels=None):
+    errors = 0
+    for line in lines:
+        line = line.rstrip()
+        if not line:
+            errors += 1
+            continue
+
+        if labels is not None:
+            try:
+                line, color = line.rsplit(',', 1)
+            except ValueError:
+                errors += 1
+                continue
+            labels.append(0 if color == 'GREEN' else 1)
+
+        for asn in line.split(' '):
+            tokens.append(vocab.setdefault(asn, len(vocab)))
+        offsets.append(len(tokens))
+
+    return errors
+
+
+def encode_corpus(corpus_filepath, labeled_filepath, output_dir):
+    '''
+    Encodes the bgp2vec corpus and the labeled paths with a single vocabulary. Each set of paths
+    is stored as the concatenation of their vocabulary indices and the offsets where each path
+    ends.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    vocab = {}
+
+    for name, filepath, labels in [('corpus', corpus_filepath, None),
+                                   ('labeled', labeled_filepath, array.array('b'))]:
+        tokens = array.array('i')
+        offsets = array.array('q', [0])
+        with open(filepath) as f:
+            errors = _encode_lines(f, vocab, tokens, offsets, labels)
+        print(f'Lines skipped due to parsing errors in {filepath}: {errors}', file=sys.stderr)
+
+        np.save(os.path.join(output_dir, f'{name}_tokens.npy'), np.frombuffer(tokens, dtype=np.int32))
+        np.save(os.path.join(output_dir, f'{name}_offsets.npy'), np.frombuffer(offsets, dtype=np.int64))
+        if labels is not None:
+            np.save(os.path.join(output_dir, 'labels.npy'), np.frombuffer(labels, dtype=np.int8))
+
+    with open(os.path.join(output_dir, 'vocab.txt'), 'w') as f:
+        f.writelines(f'{asn}\n' for asn in vocab)
+
+    # Written last, so that an interrupted encoding is not taken as complete
+    with open(os.path.join(output_dir, 'sources.json'), 'w') as f:
+        json.dump(get_sources(corpus_filepath, labeled_filepath), f)
+
+
+def get_sources(corpus_filepath, labeled_filepath):
+    sources = {}
+    for name, filepath in [('corpus', corpus_filepath), ('labeled', labeled_filepath)]:
+        st = os.stat(filepath)
+        sources[name] = {'path': os.path.abspath(filepath), 'size': st.st_size,
+                         'mtime': st.st_mtime}
+
+    return sources
+
+
+def is_encoding_current(encoded_dir, corpus_filepath, labeled_filepath):
+    try:
+        with open(os.path.join(encoded_dir, 'sources.json')) as f:
+            sources = json.load(f)
+    except FileNotFoundError:
+        return False
+
+    return sources == get_sources(corpus_filepath, labeled_filepath)
+
+
+class EncodedCorpus():
+
+    def __init__(self, encoded_dir):
+        def load(name):
+            return np.load(os.path.join(encoded_dir, f'{name}.npy'), mmap_mode='r')
+
+        self.corpus_tokens = load('corpus_tokens')
+        self.corpus_offsets = load('corpus_offsets')
+        self.labeled_tokens = load('labeled_tokens')
+        self.labeled_offsets = load('labeled_offsets')
+        self.labels = load('labels')
+
+        with open(os.path.join(encoded_dir, 'vocab.txt')) as f:
+            self.vocab = [asn.rstrip() for asn in f]
+
+    def get_npaths(self):
+        return len(self.labeled_offsets) - 1
+
+    def get_padded_paths(self, rows, maxlen):
+        '''
+        Pads the labeled paths in rows as pad_sequences(padding="post", truncating="pre") does.
+        Only the tokens of these paths are read from the memory map.
+        '''
+        ends = self.labeled_offsets[rows + 1]
+        lengths = ends - self.labeled_offsets[rows]
+
+        # Truncating at the start keeps the last maxlen ASNs of each path
+        kept = np.minimum(lengths, maxlen)
+        X = np.zeros((len(rows), maxlen), dtype=np.int32)
+        columns = np.arange(maxlen)
+        mask = columns < kept[:, None]
+        starts = ends - kept
+        X[mask] = self.labeled_tokens[(starts[:, None] + columns)[mask]] + 1
+
+        return X
+
+
+class PaddedPathsSequence(keras.utils.Sequence):
+    '''Batches of padded labeled paths, read from the encoded corpus as they are needed.'''
+
+    def __init__(self, corpus, rows, maxlen, batch_size, shuffle=False):
+        super().__init__()
+        self.corpus = corpus
+        # Batches are read in order from the memory map, unless they are shuffled for training
+        self.rows = rows if shuffle else np.sort(rows)
+        self.maxlen = maxlen
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(SPLIT_SEED)
+
+    def __len__(self):
+        return (len(self.rows) + self.batch_size - 1) // self.batch_size
+
+    def __getitem__(self, i):
+        rows = np.sort(self.rows[i*self.batch_size:(i + 1)*self.batch_size])
+        return self.corpus.get_padded_paths(rows, self.maxlen), np.asarray(self.corpus.labels[rows])
+
+    def get_labels(self):
+        '''Labels in the order of the batches, for sequences that are not shuffled.'''
+        return np.asarray(self.corpus.labels[self.rows])
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.rng.shuffle(self.rows)
+
+
+class MemmapSentences():
+    '''Restartable iterable over the encoded corpus, in the form expected by gensim.'''
+
+    def __init__(self, corpus, limit=bgp2vec.PARAMETER_NPATHS):
+        self.corpus = corpus
+        self.limit = limit
+
+    def __iter__(self):
+        vocab = self.corpus.vocab
+        npaths = min(len(self.corpus.corpus_offsets) - 1, self.limit)
+
+        for first in range(0, npaths, SENTENCES_CHUNK):
+            last = min(first + SENTENCES_CHUNK, npaths)
+            offsets = self.corpus.corpus_offsets[first:last + 1].tolist()
+            tokens = self.corpus.corpus_tokens[offsets[0]:offsets[-1]].tolist()
+
+            for start, end in zip(offsets, offsets[1:]):
+                start, end = start - offsets[0], end - offsets[0]
+                yield [vocab[t] for t in tokens[start:end]]
+
+
+def _init_worker(encoded_dir, cores_per_trial):
+    global _corpus
+    _corpus = EncodedCorpus(encoded_dir)
+
+    tf.config.threading.set_intra_op_parallelism_threads(cores_per_trial)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def get_embedding_vectors(b2v, vocab):
+    '''Embedding matrix indexed by the encoded vocabulary shifted by one, as 0 is padding.'''
+    embedding_vectors = np.zeros((len(vocab) + 1, b2v.vector_size))
+    for i, asn in enumerate(vocab):
+        if asn in b2v.wv.key_to_index:
+            embedding_vectors[i + 1] = b2v.wv.get_vector(asn)
+
+    return embedding_vectors
+
+
+def run_bgp2vec_trial(trial):
+    start = time.perf_counter()
+
+    b2v = bgp2vec.get_bgp2vec_from_corpus(MemmapSentences(_corpus),
+                                          workers=trial['cores'],
+                                          **trial['params'])
+    b2v.save(trial['output'])
+
+    return {
+        'trial': trial['name'],
+        'stage': 'bgp2vec',
+        **trial['params'],
+        'vocab_size': len(b2v.wv.key_to_index),
+        'wall_time': time.perf_counter() - start,
+    }
+
+
+def run_lstm_trial(trial):
+    start = time.perf_counter()
+
+    b2v = KeyedVectors.load(trial['b2v'])
+    params = trial['params']
+
+    # Same split for every trial, made over row indices instead of the padded paths
+    npaths = _corpus.get_npaths()
+    rows = np.random.default_rng(SPLIT_SEED).permutation(npaths)
+    ntrain = int(TRAIN_SIZE*npaths)
+
+    train = PaddedPathsSequence(_corpus, rows[:ntrain], params['maxlen'], params['batch_size'],
+                                shuffle=True)
+    test = PaddedPathsSequence(_corpus, rows[ntrain:], params['maxlen'], params['batch_size'])
+
+    model = lstm.build_model(get_embedding_vectors(b2v, _corpus.vocab), maxlen=params['maxlen'])
+    history = model.fit(train, validation_data=test, epochs=params['epochs'], verbose=0)
+
+    preds = (model.predict(test)[:, 0] > 0.5).astype(np.int8)
+    m = np.array(lstm.get_confusion_matrix(test.get_labels(), preds))
+
+    return {
+        'trial': trial['name'],
+        'stage': 'lstm',
+        'bgp2vec_trial': trial['b2v_name'],
+        **trial['b2v_params'],
+        **params,
+        'val_loss': history.history['val_loss'][-1],
+        'val_accuracy': history.history['val_accuracy'][-1],
+        'true_negative_rate': m[0][0],
+        'true_positive_rate': m[1][1],
+        'wall_time': time.perf_counter() - start,
+    }
+
+
+def get_grid(grid, defaults):
+    values = [grid.get(name, [default]) for name, default in defaults.items()]
+    return [dict(zip(defaults, combination)) for combination in it.product(*values)]
+
+
+def get_failed_trial(trial, stage, error):
+    row = {'trial': trial['name'], 'stage': stage, **trial['params'], 'error': error}
+    if stage == 'lstm':
+        row.update({'bgp2vec_trial': trial['b2v_name'], **trial['b2v_params']})
+
+    return row
+
+
+def run_trial(job):
+    function, stage, trial = job
+    try:
+        return function(trial)
+    except Exception as e:
+        return get_failed_trial(trial, stage, repr(e))
+
+
+def run_trials(pool, function, stage, trials, writer, f):
+    failed = set()
+    jobs = [(function, stage, trial) for trial in trials]
+
+    for row in pool.imap_unordered(run_trial, jobs):
+        if row.get('error'):
+            print(f'Trial {row["trial"]} failed: {row["error"]}', file=sys.stderr)
+            failed.add(row['trial'])
+        else:
+            print(f'Finished trial {row["trial"]} in {row["wall_time"]:.1f}s', file=sys.stderr)
+
+        # Written as trials finish, so that results are kept if the sweep is interrupted
+        writer.writerow(row)
+        f.flush()
+
+    return failed
+
+
+def main(args):
+    with open(args.grid) as f:
+        grid = json.load(f)
+
+    unknown = set(grid) - set(BGP2VEC_PARAMETERS) - set(LSTM_PARAMETERS)
+    if unknown:
+        raise ValueError(f'Unknown parameters in grid: {sorted(unknown)}')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    encoded_dir = os.path.join(args.output_dir, 'encoded')
+    if args.reencode or not is_encoding_current(encoded_dir, args.as_paths, args.labeled_paths):
+        print('Encoding corpus...', file=sys.stderr)
+        encode_corpus(args.as_paths, args.labeled_paths, encoded_dir)
+
+    cores_per_trial = min(args.cores_per_trial, args.cores)
+    nprocesses = max(args.cores // cores_per_trial, 1)
+
+    b2v_trials = []
+    for i, params in enumerate(get_grid(grid, BGP2VEC_PARAMETERS)):
+        name = f'b2v_{i}'
+        b2v_trials.append({'name': name, 'params': params, 'cores': cores_per_trial,
+                           'output': os.path.join(args.output_dir, f'{name}.b2v')})
+
+    lstm_trials = []
+    for b2v_trial, params in it.product(b2v_trials, get_grid(grid, LSTM_PARAMETERS)):
+        lstm_trials.append({'name': f'lstm_{len(lstm_trials)}', 'params': params,
+                            'b2v': b2v_trial['output'], 'b2v_name': b2v_trial['name'],
+                            'b2v_params': b2v_trial['params']})
+
+    # Spawned workers, as tensorflow does not support being forked
+    ctx = mp.get_context('spawn')
+    with open(args.results, 'w', newline='') as f, \
+         ctx.Pool(nprocesses, initializer=_init_worker, initargs=(encoded_dir, cores_per_trial),
+                  maxtasksperchild=1) as pool:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+
+        failed = run_trials(pool, run_bgp2vec_trial, 'bgp2vec', b2v_trials, writer, f)
+
+        for trial in lstm_trials:
+            if trial['b2v_name'] in failed:
+                writer.writerow(get_failed_trial(trial, 'lstm', f'{trial["b2v_name"]} failed'))
+        lstm_trials = [trial for trial in lstm_trials if trial['b2v_name'] not in failed]
+
+        run_trials(pool, run_lstm_trial, 'lstm', lstm_trials, writer, f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('as_paths', help='path to file containing as_paths')
+    parser.add_argument('labeled_paths', help='path to file containing the labeled paths')
+    parser.add_argument('grid', help='path to a JSON file with the parameter grid')
+    parser.add_argument('output_dir', help='directory where the encoded corpus and models are saved')
+    parser.add_argument('results', help='path where the CSV with the results will be saved')
+    parser.add_argument('--cores', type=int, default=os.cpu_count(),
+                        help='total number of cores used by the sweep')
+    parser.add_argument('--cores-per-trial', type=int, default=bgp2vec.NWORKERS_WORD2VEC,
+                        help='number of cores used by each trial')
+    parser.add_argument('--reencode', action='store_true',
+                        help='encode the corpus even if the encoding matches the given files')
+    args = parser.parse_args()
+
+    main(args)
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
 import argparse
+import bisect
+import datetime as dt
 import os
+import pickle
 import sys
 
 
@@ -14,39 +17,182 @@ RELAT = {
 }
 
 
-class ASRelationshipGraph():
+def read_relationships(as_relationships: str):
+    graph = {}
+
+    f = open(as_relationships)
+    for line in f:
+        if line.startswith('#'):
+            continue
+        l = line.split('|')
+        as1, as2, relat = int(l[0]), int(l[1]), int(l[2])
+
+        graph[(as1, as2)] = RELAT[relat]
+
+    return graph
+
+
+def _to_date(timestamp):
+    if isinstance(timestamp, dt.datetime):
+        return timestamp.date()
+    if isinstance(timestamp, dt.date):
+        return timestamp
+    return dt.datetime.fromisoformat(str(timestamp)).date()
+
+
+class RelationshipStore():
+    '''
+    Keeps AS relationships from several dates as a base snapshot plus the changes of each later
+    snapshot with respect to the previous one. Removed edges are stored as None in the deltas.
+
+    A checkout of the first snapshot is the base itself. For later dates, a flat dict is built
+    by applying the deltas, starting from the last checkout when moving forward in time, and only
+    the last one is kept. Dates before the first snapshot get the first snapshot.
+    '''
+
+    def __init__(self, base, base_date=None):
+        self.base = base
+        self.dates = [base_date]
+        self.deltas = [{}]
+        self._checkout = (0, base)
+
+    @classmethod
+    def from_snapshots(cls, snapshots):
+        '''Builds the store from (date, as_relationships filepath) pairs.'''
+        snapshots = sorted((_to_date(date), filepath) for date, filepath in snapshots)
+
+        base_date, base_filepath = snapshots[0]
+        store = cls(read_relationships(base_filepath), base_date)
+
+        previous = store.base
+        for date, filepath in snapshots[1:]:
+            current = read_relationships(filepath)
+            store.add_delta(date, previous, current)
+            previous = current
+
+        return store
+
+    @classmethod
+    def from_directory(cls, dirpath):
+        '''Builds the store from the snapshots in dirpath, named starting with YYYYMMDD.'''
+        snapshots = []
+        for f in os.listdir(dirpath):
+            try:
+                date = dt.datetime.strptime(f[:8], '%Y%m%d').date()
+            except ValueError:
+                print(f'Ignoring file without date {f}', file=sys.stderr)
+                continue
+            snapshots.append((date, os.path.join(dirpath, f)))
+
+        return cls.from_snapshots(snapshots)
+
+    def add_delta(self, date, previous, current):
+        if self.dates[-1] is not None and date <= self.dates[-1]:
+            raise ValueError(f'Snapshots must be added in chronological order: {date}')
+
+        delta = {edge: rel for edge, rel in current.items() if previous.get(edge) != rel}
+        for edge in previous:
+            if edge not in current:
+                delta[edge] = None
+
+        self.dates.append(date)
+        self.deltas.append(delta)
+
+    def get_version(self, timestamp=None):
+        '''Index of the snapshot valid at timestamp, or of the latest one if it is None.'''
+        if timestamp is None:
+            return len(self.dates) - 1
+        if self.dates[0] is None:
+            raise ValueError('Relationships without dates cannot be queried as of a date')
+        return bisect.bisect_right(self.dates[1:], _to_date(timestamp))
+
+    def checkout(self, timestamp=None):
+        version = self.get_version(timestamp)
+        if version == 0:
+            return self.base
+
+        last_version, last_graph = self._checkout
+        if version == last_version:
+            return last_graph
+
+        # Checkouts are handed out, so the graph is copied instead of modified in place
+        if version > last_version:
+            graph = dict(last_graph)
+        else:
+            graph, last_version = dict(self.base), 0
+
+        for delta in self.deltas[last_version + 1:version + 1]:
+            for edge, rel in delta.items():
+                if rel is None:
+                    graph.pop(edge, None)
+                else:
+                    graph[edge] = rel
+
+        self._checkout = (version, graph)
+        return graph
 
-    def __init__(self, as_relationships):
-        self.graph = self._build_graph(as_relationships)
+    def save(self, filepath):
+        with open(filepath, 'wb') as f:
+            pickle.dump((self.base, self.dates, self.deltas), f, protocol=pickle.HIGHEST_PROTOCOL)
 
-    def _build_graph(self, as_relationships: str):
-        graph = {}
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, 'rb') as f:
+            base, dates, deltas = pickle.load(f)
 
-        f = open(as_relationships)
-        for line in f:
-            l = line.split('|')
-            as1, as2, relat = int(l[0]), int(l[1]), int(l[2])
+        store = cls(base, dates[0])
+        store.dates = dates
+        store.deltas = deltas
+        return store
 
-            graph[(as1, as2)] = RELAT[relat]
 
-        return graph
+class ASRelationshipGraph():
 
-    def get_relationship(self, as1, as2):
+    def __init__(self, as_relationships):
+        if isinstance(as_relationships, RelationshipStore):
+            self.store = as_relationships
+        elif os.path.isdir(as_relationships):
+            self.store = RelationshipStore.from_directory(as_relationships)
+        else:
+            self.store = RelationshipStore(read_relationships(as_relationships))
+
+        self.latest_version = self.store.get_version()
+        self.graph = self.store.checkout()
+        self._timestamp = None
+        self._timestamp_graph = self.graph
+
+    def _get_graph(self, timestamp):
+        if timestamp is None:
+            return self.graph
+
+        # Paths are usually queried many times as of the same date
+        if timestamp != self._timestamp:
+            if self.store.get_version(timestamp) == self.latest_version:
+                self._timestamp_graph = self.graph
+            else:
+                self._timestamp_graph = self.store.checkout(timestamp)
+            self._timestamp = timestamp
 
-        if (as1, as2) in self.graph:
-            return self.graph[(as1, as2)]
+        return self._timestamp_graph
 
-        elif (as2, as1) in self.graph:
-            rel = self.graph[(as2, as1)]
-            if rel == 'P2C':
-                return 'C2P'
-            return rel
+    def get_relationship(self, as1, as2, timestamp=None):
+        return self._lookup_relationship(self._get_graph(timestamp), as1, as2)
 
-        return None
+    @staticmethod
+    def _lookup_relationship(graph, as1, as2):
+        rel = graph.get((as1, as2))
+        if rel is not None:
+            return rel
 
+        rel = graph.get((as2, as1))
+        if rel == 'P2C':
+            return 'C2P'
+        return rel
 
-    def is_vf(self, path):
-        edges = [self.get_relationship(path[i], path[i + 1]) for i, _ in enumerate(path[:-1])]
+    def is_vf(self, path, timestamp=None):
+        graph = self._get_graph(timestamp)
+        edges = [self._lookup_relationship(graph, path[i], path[i + 1])
+                 for i, _ in enumerate(path[:-1])]
 
         try:
             p2c_index = edges.index('P2C')
@@ -72,13 +218,18 @@ def main(args):
 
     asr = ASRelationshipGraph(args.as_relationships)
 
+    try:
+        asr.store.get_version(args.as_of)
+    except ValueError as e:
+        sys.exit(f'Cannot use --as-of {args.as_of}: {e}')
+
     not_vf = 0
     for i, l in enumerate(sys.stdin):
         # path_str = l.split('|')[2].rstrip()
         path_str = l.rstrip()
         try:
             path = list(map(int, path_str.split(' ')))
-            vf = asr.is_vf(path)
+            vf = asr.is_vf(path, args.as_of)
 
             if vf:
                 color = 'GREEN'
@@ -96,7 +247,11 @@ def main(args):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument('as_relationships', help='path to a file describing AS relationships')
+    parser.add_argument('as_relationships',
+                        help='path to a file describing AS relationships, or to a directory of '
+                        'such files whose names start with their date (YYYYMMDD)')
+    parser.add_argument('--as-of', default=None, type=dt.date.fromisoformat,
+                        help='label paths using the relationships as of this date (YYYY-MM-DD)')
     args = parser.parse_args()
 
     main(args)